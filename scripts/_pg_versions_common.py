@@ -0,0 +1,131 @@
+"""Shared helpers for scripts that propagate scripts/postgres-versions.json."""
+
+import functools
+import os
+import re
+import stat
+import tempfile
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from _script_utils import REPO_ROOT
+
+VERSIONS_FILE = REPO_ROOT / "scripts/postgres-versions.json"
+DOCKER_BAKE = REPO_ROOT / "docker/docker-bake.hcl"
+
+# os.umask can only be read by setting it, so probe it once at import rather than
+# from the thread pool that calls atomic_write.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+PG_VERSION_RE = re.compile(r"POSTGRES_VERSION=\d+\.\d+\.\d+")
+
+
+@dataclass(frozen=True, slots=True)
+class Replacements:
+    """Replacement text for each sync target, rendered once per run."""
+
+    bake_block: str
+    dockerfile_line: str
+    mise_array: str
+
+    @classmethod
+    def from_versions(cls, versions: dict[str, str]) -> "Replacements":
+        newest_major = versions["newest"].split(".")[0]
+        oldest_major = versions["oldest"].split(".")[0]
+        bake_block = f'''variable "PG_VERSIONS" {{
+  default = {{
+    pg{oldest_major} = "{versions["oldest"]}"
+    pg{newest_major} = "{versions["newest"]}"
+  }}
+}}'''
+        return cls(
+            bake_block=bake_block,
+            dockerfile_line=f"POSTGRES_VERSION={versions['oldest']}",
+            mise_array=f'VERSIONS=("{versions["oldest"]}" "{versions["newest"]}")',
+        )
+
+
+def atomic_write(path: Path, data: str | bytes) -> None:
+    """Replace path with data via an fsynced sibling temp file and os.replace.
+
+    A crash leaves either the old or the new content, never a partial file. Symlinks
+    are resolved first so the link's target is written rather than the link replaced.
+    Text is encoded as UTF-8.
+    """
+    path = path.resolve()
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    mode = stat.S_IMODE(path.stat().st_mode) if path.exists() else 0o666 & ~_UMASK
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+@functools.cache
+def dockerfiles() -> list[Path]:
+    return sorted((REPO_ROOT / "docker").glob("Dockerfile.*"))
+
+
+def update_docker_bake(content: str, reps: Replacements) -> tuple[str, bool]:
+    """Update PG_VERSIONS in docker-bake.hcl, locating the block by balancing its braces."""
+    i = content.find('variable "PG_VERSIONS"')
+    if i == -1:
+        return content, False
+    k = content.find("{", i)
+    if k == -1:
+        return content, False
+    depth = 0
+    while k < len(content):
+        c = content[k]
+        k += 1
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                break
+    else:
+        return content, False
+    if content[i:k] == reps.bake_block:
+        return content, False
+    return content[:i] + reps.bake_block + content[k:], True
+
+
+def sub_changed(pattern: re.Pattern[str], repl: str, content: str) -> tuple[str, bool]:
+    """Substitute every match, reporting whether the text actually changed.
+
+    A bare `subn` count also counts matches that already equal `repl`.
+    """
+    new = pattern.sub(repl, content)
+    return new, new != content
+
+
+def update_dockerfile(content: str, reps: Replacements) -> tuple[str, bool]:
+    """Update default POSTGRES_VERSION in a Dockerfile."""
+    if "POSTGRES_VERSION=" not in content:
+        return content, False
+    return sub_changed(PG_VERSION_RE, reps.dockerfile_line, content)
+
+
+def rewrite_file(
+    path: Path,
+    transform: Callable[[str, Replacements], tuple[str, bool]],
+    reps: Replacements,
+) -> bool:
+    """Apply transform to path, writing only if it reports a change."""
+    content, changed = transform(path.read_text(encoding="utf-8"), reps)
+    if not changed:
+        return False
+    atomic_write(path, content)
+    return True
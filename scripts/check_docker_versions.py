@@ -14,11 +14,18 @@ import re
 import sys
 from dataclasses import dataclass
 
+from _pg_versions_common import (
+    DOCKER_BAKE,
+    VERSIONS_FILE,
+    Replacements,
+    dockerfiles,
+    rewrite_file,
+    update_docker_bake,
+    update_dockerfile,
+)
 from _script_utils import REPO_ROOT
 
-VERSIONS_FILE = REPO_ROOT / "scripts/postgres-versions.json"
-DOCKER_BAKE = REPO_ROOT / "docker/docker-bake.hcl"
-DOCKERFILES = sorted((REPO_ROOT / "docker").glob("Dockerfile.*"))
+_BAKE_ENTRY_RE = re.compile(r'pg(\d+)\s*=\s*"([\d.]+)"')
 
 
 @dataclass(frozen=True)
@@ -44,14 +51,28 @@ def _bake_mismatch(versions: dict[str, str]) -> bool:
     oldest_major = versions["oldest"].split(".")[0]
     newest_major = versions["newest"].split(".")[0]
     expected = {oldest_major: versions["oldest"], newest_major: versions["newest"]}
-    found = dict(re.findall(r'pg(\d+)\s*=\s*"([\d.]+)"', DOCKER_BAKE.read_text()))
-    return found != expected
+    return _bake_versions(DOCKER_BAKE.read_text()) != expected
+
+
+def _bake_versions(content: str) -> dict[str, str]:
+    """Collect the `pgNN = "X.Y.Z"` entries from the PG_VERSIONS default map."""
+    idx = content.find('variable "PG_VERSIONS"')
+    if idx == -1:
+        return {}
+    default = content.find("default", idx, content.find("}", idx))
+    if default == -1:
+        return {}
+    lb = content.find("{", default)
+    rb = content.find("}", lb)
+    if lb == -1 or rb == -1:
+        return {}
+    return dict(_BAKE_ENTRY_RE.findall(content, lb + 1, rb))
 
 
 def _stale_dockerfiles(versions: dict[str, str]) -> list:
     return [
         dockerfile
-        for dockerfile in DOCKERFILES
+        for dockerfile in dockerfiles()
         if f"ARG POSTGRES_VERSION={versions['oldest']}" not in dockerfile.read_text()
     ]
 
@@ -75,30 +96,11 @@ def main() -> int:
         print("Run with --fix, or: scripts/sync-postgres-versions.py --apply")
         return 1
 
+    reps = Replacements.from_versions(versions)
     if bake_mismatch:
-        oldest_major = versions["oldest"].split(".")[0]
-        newest_major = versions["newest"].split(".")[0]
-        new_block = f"""variable "PG_VERSIONS" {{
-  default = {{
-    pg{oldest_major} = "{versions["oldest"]}"
-    pg{newest_major} = "{versions["newest"]}"
-  }}
-}}"""
-        content = re.sub(
-            r'variable "PG_VERSIONS" \{[^}]+\}[^}]*\}',
-            new_block,
-            DOCKER_BAKE.read_text(),
-            flags=re.DOTALL,
-        )
-        DOCKER_BAKE.write_text(content)
-
+        rewrite_file(DOCKER_BAKE, update_docker_bake, reps)
     for dockerfile in stale_dockerfiles:
-        content = re.sub(
-            r"POSTGRES_VERSION=\d+\.\d+\.\d+",
-            f"POSTGRES_VERSION={versions['oldest']}",
-            dockerfile.read_text(),
-        )
-        dockerfile.write_text(content)
+        rewrite_file(dockerfile, update_dockerfile, reps)
 
     still_bake_mismatch = _bake_mismatch(versions)
     still_stale = _stale_dockerfiles(versions)
@@ -1,7 +1,7 @@
 #!/usr/bin/env -S uv run --script
 # /// script
 # requires-python = ">=3.11"
-# dependencies = ["httpx"]
+# dependencies = ["httpx[http2]", "orjson"]
 # ///
 """Sync PostgreSQL versions across all project files.
 
@@ -10,63 +10,137 @@ Updates: ci.yml, docker/docker-bake.hcl, mise.toml, docker/Dockerfile.*
 """
 
 import argparse
+import atexit
 import json
 import os
 import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import httpx
+import orjson
+from _pg_versions_common import (
+    DOCKER_BAKE,
+    VERSIONS_FILE,
+    Replacements,
+    atomic_write,
+    dockerfiles,
+    sub_changed,
+    update_docker_bake,
+    update_dockerfile,
+)
+from _script_utils import REPO_ROOT
 
-REPO_ROOT = Path(__file__).parent.parent
-VERSIONS_FILE = REPO_ROOT / "scripts/postgres-versions.json"
-DOCKER_BAKE = REPO_ROOT / "docker/docker-bake.hcl"
 MISE_TOML = REPO_ROOT / "mise.toml"
-DOCKERFILES = list((REPO_ROOT / "docker").glob("Dockerfile.*"))
+RELEASES_CACHE = REPO_ROOT / ".cache/releases.json"
 NUM_SUPPORTED_VERSIONS = 5
 MIN_MAJOR_VERSION = 14
+MAX_IO_WORKERS = 8
+
+_MISE_VERSIONS_RE = re.compile(r'VERSIONS=\("[\d\.]+" "[\d\.]+"\s*(?:"[\d\.]+")?\)')
 
 
 def fetch_available_versions() -> dict[int, str]:
-    """Fetch latest patch version for each major from theseus-rs/postgresql-binaries."""
-    url = "https://api.github.com/repos/theseus-rs/postgresql-binaries/releases?per_page=100"
+    """Fetch latest patch version for each major from theseus-rs/postgresql-binaries.
+
+    Releases are listed newest-first, so later pages are only requested until
+    NUM_SUPPORTED_VERSIONS qualifying majors have been seen.
+    """
+    url = "https://api.github.com/repos/theseus-rs/postgresql-binaries/releases?per_page=30"
     headers = {}
     if github_token := os.environ.get("GITHUB_TOKEN") or os.environ.get("GH_TOKEN"):
         headers["Authorization"] = f"Bearer {github_token}"
-    resp = httpx.get(url, headers=headers if headers else None, timeout=30)
-    resp.raise_for_status()
-
-    releases = resp.json()
-    latest_by_major: dict[int, str] = {}
-
+    cache = _read_releases_cache(url)
+    first_page_headers = {}
+    if cached_etag := cache.get("etag"):
+        first_page_headers["If-None-Match"] = cached_etag
+
+    latest_by_major: dict[int, tuple[tuple[int, ...], str]] = {}
+    with httpx.Client(http2=True, headers=headers, timeout=30) as client:
+        resp = client.get(url, headers=first_page_headers)
+        if resp.status_code == httpx.codes.NOT_MODIFIED:
+            return cache["latest_by_major"]
+        resp.raise_for_status()
+
+        etag = resp.headers.get("ETag")
+        while True:
+            _collect_latest_by_major(orjson.loads(resp.content), latest_by_major)
+            if len(latest_by_major) >= NUM_SUPPORTED_VERSIONS:
+                break
+            if not (url := resp.links.get("next", {}).get("url")):
+                break
+            resp = client.get(url)
+            resp.raise_for_status()
+
+    available = {major: version for major, (_, version) in latest_by_major.items()}
+    if etag:
+        _write_releases_cache(url, etag, available)
+    return available
+
+
+def _collect_latest_by_major(
+    releases: list[dict], latest_by_major: dict[int, tuple[tuple[int, ...], str]]
+) -> None:
+    """Record the highest (version tuple, tag) per supported major from one page of releases."""
     for release in releases:
         version = release.get("tag_name", "")
-        if not version:
-            continue
-
-        parts = version.split(".")
-        if len(parts) < 2:
-            continue
-
         try:
-            major = int(parts[0])
+            vt = _version_tuple(version)
         except ValueError:
             continue
 
-        if major < MIN_MAJOR_VERSION:
+        if len(vt) < 2:
             continue
 
-        if major not in latest_by_major or _version_tuple(version) > _version_tuple(
-            latest_by_major[major]
-        ):
-            latest_by_major[major] = version
+        major = vt[0]
+        if major < MIN_MAJOR_VERSION:
+            continue
 
-    return latest_by_major
+        cur = latest_by_major.get(major)
+        if cur is None or vt > cur[0]:
+            latest_by_major[major] = (vt, version)
+
+
+def _read_releases_cache(url: str) -> dict:
+    """Read the ETag and parsed versions saved from the last releases API response.
+
+    Returns {} unless the file holds both a string ETag and a major -> version map
+    that was built from the same URL and MIN_MAJOR_VERSION.
+    """
+    if not RELEASES_CACHE.exists():
+        return {}
+    try:
+        cache = json.loads(RELEASES_CACHE.read_text())
+        etag, latest_by_major = cache["etag"], cache["latest_by_major"]
+        if not isinstance(etag, str) or not isinstance(latest_by_major, dict):
+            return {}
+        if cache["url"] != url or cache["min_major_version"] != MIN_MAJOR_VERSION:
+            return {}
+        return {
+            "etag": etag,
+            "latest_by_major": {int(major): str(v) for major, v in latest_by_major.items()},
+        }
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return {}
+
+
+def _write_releases_cache(url: str, etag: str, latest_by_major: dict[int, str]) -> None:
+    """Save the ETag so the next run can send If-None-Match and skip an unchanged list."""
+    RELEASES_CACHE.parent.mkdir(exist_ok=True)
+    cache = {
+        "etag": etag,
+        "latest_by_major": latest_by_major,
+        "min_major_version": MIN_MAJOR_VERSION,
+        "url": url,
+    }
+    atomic_write(RELEASES_CACHE, json.dumps(cache, indent=2) + "\n")
 
 
 def _version_tuple(version: str) -> tuple[int, ...]:
-    """Convert version string to tuple for comparison."""
-    return tuple(int(p) for p in version.split(".") if p.isdigit())
+    """Convert version string to tuple for comparison; raises ValueError if malformed."""
+    return tuple(map(int, version.split(".")))
 
 
 def get_recommended_versions(available: dict[int, str]) -> dict[str, str]:
@@ -93,80 +167,57 @@ def read_versions_file() -> dict[str, str]:
 
 def write_versions_file(versions: dict[str, str]) -> None:
     """Write versions to scripts/postgres-versions.json."""
-    content = json.dumps(versions, indent=2) + "\n"
-    VERSIONS_FILE.write_text(content)
-
-
-def update_docker_bake(versions: dict[str, str]) -> bool:
-    """Update PG_VERSIONS in docker-bake.hcl."""
-    content = DOCKER_BAKE.read_text()
-    original = content
-
-    newest_major = versions["newest"].split(".")[0]
-    oldest_major = versions["oldest"].split(".")[0]
-
-    new_versions = f'''variable "PG_VERSIONS" {{
-  default = {{
-    pg{oldest_major} = "{versions["oldest"]}"
-    pg{newest_major} = "{versions["newest"]}"
-  }}
-}}'''
-
-    content = re.sub(
-        r'variable "PG_VERSIONS" \{[^}]+\}[^}]*\}',
-        new_versions,
-        content,
-        flags=re.DOTALL,
-    )
+    atomic_write(VERSIONS_FILE, orjson.dumps(versions, option=orjson.OPT_INDENT_2) + b"\n")
 
-    if content == original:
-        return False
 
-    DOCKER_BAKE.write_text(content)
-    return True
+def load_targets() -> dict[Path, str]:
+    """Read every file rewritten by --apply in a single, concurrent pass."""
+    paths = [DOCKER_BAKE, MISE_TOML, *dockerfiles()]
+    with ThreadPoolExecutor(max_workers=min(MAX_IO_WORKERS, len(paths))) as ex:
+        return dict(zip(paths, ex.map(lambda p: p.read_text(encoding="utf-8"), paths)))
 
 
-def update_mise_toml(versions: dict[str, str]) -> bool:
+def update_mise_toml(content: str, reps: Replacements) -> tuple[str, bool]:
     """Update test-version-matrix defaults in mise.toml."""
-    content = MISE_TOML.read_text()
-    original = content
+    if "VERSIONS=(" not in content:
+        return content, False
+    return sub_changed(_MISE_VERSIONS_RE, reps.mise_array, content)
 
-    content = re.sub(
-        r'VERSIONS=\("[\d\.]+" "[\d\.]+"\s*(?:"[\d\.]+")?\)',
-        f'VERSIONS=("{versions["oldest"]}" "{versions["newest"]}")',
-        content,
-    )
-
-    if content == original:
-        return False
 
-    MISE_TOML.write_text(content)
-    return True
+def write_targets(targets: dict[Path, str], reps: Replacements) -> None:
+    """Apply each file's transform and write back only the files that changed."""
+    transforms = {
+        DOCKER_BAKE: update_docker_bake,
+        MISE_TOML: update_mise_toml,
+    } | dict.fromkeys(dockerfiles(), update_dockerfile)
 
+    changed = {}
+    for path, original in targets.items():
+        content, updated = transforms[path](original, reps)
+        if updated:
+            changed[path] = content
+        print(f"  {path.relative_to(REPO_ROOT)}: {'updated' if path in changed else 'no changes'}")
 
-def update_dockerfiles(versions: dict[str, str]) -> bool:
-    """Update default POSTGRES_VERSION in Dockerfiles."""
-    changed = False
+    if changed:
+        with ThreadPoolExecutor(max_workers=min(MAX_IO_WORKERS, len(changed))) as ex:
+            list(ex.map(atomic_write, changed, changed.values()))
 
-    for dockerfile in DOCKERFILES:
-        content = dockerfile.read_text()
-        new_content = re.sub(
-            r"POSTGRES_VERSION=\d+\.\d+\.\d+",
-            f"POSTGRES_VERSION={versions['oldest']}",
-            content,
-        )
-        if new_content != content:
-            dockerfile.write_text(new_content)
-            changed = True
 
-    return changed
+_gh_output_buffer: list[tuple[str, str]] = []
 
 
 def set_github_output(key: str, value: str) -> None:
-    """Set GitHub Actions output variable."""
-    if output_file := os.environ.get("GITHUB_OUTPUT"):
+    """Queue a GitHub Actions output variable; written by flush_github_output."""
+    _gh_output_buffer.append((key, value))
+
+
+@atexit.register
+def flush_github_output() -> None:
+    """Append all queued output variables to GITHUB_OUTPUT in a single write."""
+    if _gh_output_buffer and (output_file := os.environ.get("GITHUB_OUTPUT")):
         with open(output_file, "a") as f:
-            f.write(f"{key}={value}\n")
+            f.writelines(f"{k}={v}\n" for k, v in _gh_output_buffer)
+    _gh_output_buffer.clear()
 
 
 def main() -> int:
@@ -174,15 +225,32 @@ def main() -> int:
     parser.add_argument(
         "--check",
         action="store_true",
-        help="Check for updates without modifying files",
+        help="Check for updates without modifying tracked files (refreshes .cache/releases.json)",
     )
     parser.add_argument(
         "--apply",
         action="store_true",
         help="Apply updates to files",
     )
+    parser.add_argument(
+        "--max-age",
+        type=int,
+        default=0,
+        metavar="SECONDS",
+        help="Skip the upstream check (including --check) if postgres-versions.json "
+        "was modified within this many seconds",
+    )
     args = parser.parse_args()
 
+    if (
+        args.max_age
+        and VERSIONS_FILE.exists()
+        and (time.time() - VERSIONS_FILE.stat().st_mtime) < args.max_age
+    ):
+        print(f"Cached: scripts/postgres-versions.json modified within {args.max_age}s, skipping")
+        set_github_output("updated", "false")
+        return 0
+
     print("Fetching versions from theseus-rs/postgresql-binaries...")
     available = fetch_available_versions()
 
@@ -236,14 +304,7 @@ def main() -> int:
         write_versions_file(recommended)
         print("  scripts/postgres-versions.json: updated")
 
-        updated_bake = update_docker_bake(recommended)
-        print(f"  docker-bake.hcl: {'updated' if updated_bake else 'no changes'}")
-
-        updated_mise = update_mise_toml(recommended)
-        print(f"  mise.toml: {'updated' if updated_mise else 'no changes'}")
-
-        updated_dockerfiles = update_dockerfiles(recommended)
-        print(f"  test/Dockerfile.*: {'updated' if updated_dockerfiles else 'no changes'}")
+        write_targets(load_targets(), Replacements.from_versions(recommended))
 
         set_github_output("updated", "true")
         set_github_output(